@@ -0,0 +1,12 @@
+from ex120.operations import (STATUS_NOT_CONVERGED, STATUS_NOT_SQUARE, STATUS_OK, STATUS_SINGULAR,
+                              LUFactorization, MatrixResult, RowStatistics, SVDAccuracy,
+                              SparseLUFactorization, add_vector_to_rows, calculate_determinant,
+                              calculate_determinant_batch, calculate_rank, calculate_rank_batch,
+                              create_matrix_file, empty_matrix_file, generate_matrix,
+                              generate_matrix_chunks, get_precision, inverse_matrix,
+                              inverse_matrix_batch, lu_factorize, modify_column, modify_element,
+                              open_matrix_file, precision, rank_from_singular_values, set_precision,
+                              singular_value_decomposition, singular_value_decomposition_batch,
+                              solve_system, solve_system_batch, sort_matrix_by_column,
+                              sort_matrix_by_row, sort_matrix_by_row_avg, sort_rows_by,
+                              svd_accuracy, to_dense)
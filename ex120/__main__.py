@@ -0,0 +1,58 @@
+import numpy as np
+
+from ex120 import (add_vector_to_rows, calculate_determinant, calculate_rank, generate_matrix,
+                   inverse_matrix, modify_column, modify_element, singular_value_decomposition,
+                   sort_matrix_by_column, sort_matrix_by_row, sort_matrix_by_row_avg)
+
+
+def main():
+    # Example usage
+    N, M = 4, 4  # Example size, can be changed
+    matrix = generate_matrix(N, M)
+    print("Original Matrix:")
+    print(matrix)
+
+    # Determinant and Inverse (if applicable)
+    print("\nDeterminant:", calculate_determinant(matrix))
+    print("\nInverse Matrix:")
+    print(inverse_matrix(matrix))
+
+    # Sorting
+    print("\nMatrix sorted by row:")
+    print(sort_matrix_by_row(matrix))
+    print("\nMatrix sorted by column:")
+    print(sort_matrix_by_column(matrix))
+    print("\nMatrix sorted by row average:")
+    print(sort_matrix_by_row_avg(matrix))
+
+    # Modify element
+    matrix = modify_element(matrix, 1, 2, 999)
+    print("\nModified Matrix (Element Changed):")
+    print(matrix)
+
+    # Modify column
+    matrix = modify_column(matrix, 2)
+    print("\nModified Matrix (Column Increased by 2):")
+    print(matrix)
+
+    # Adding a vector
+    vector = np.random.randint(-10, 10, (1, M))
+    matrix = add_vector_to_rows(matrix, vector)
+    print("\nMatrix after adding a vector:")
+    print(matrix)
+
+    # Matrix Rank
+    print("\nMatrix Rank:", calculate_rank(matrix))
+
+    # SVD
+    U, S, V = singular_value_decomposition(matrix)
+    print("\nMatrix U:")
+    print(U)
+    print("\nSingular values S:")
+    print(S)
+    print("\nMatrix V:")
+    print(V)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from ex120 import (add_vector_to_rows, calculate_determinant, calculate_determinant_batch,
+                   calculate_rank, calculate_rank_batch, generate_matrix, inverse_matrix,
+                   inverse_matrix_batch, precision, singular_value_decomposition,
+                   singular_value_decomposition_batch, solve_system, sort_matrix_by_column,
+                   sort_matrix_by_row, sort_matrix_by_row_avg)
+
+SHAPES = {
+    "square": lambda n: (n, n),
+    "tall": lambda n: (n, max(1, n // 4)),
+    "wide": lambda n: (max(1, n // 4), n),
+}
+
+# name -> (function of one matrix, needs a square matrix). Matrices are passed as fresh
+# views so every call misses the LU cache and pays for a full factorization.
+OPERATIONS = {
+    "determinant": (lambda m: calculate_determinant(m.view()), True),
+    "inverse": (lambda m: inverse_matrix(m.view()), True),
+    "solve": (lambda m: solve_system(m.view(), np.ones(m.shape[0], dtype=m.dtype)), True),
+    "rank": (lambda m: calculate_rank(m), False),
+    "svd": (lambda m: singular_value_decomposition(m, full_matrices=False), False),
+    "sort_rows": (sort_matrix_by_row, False),
+    "sort_columns": (sort_matrix_by_column, False),
+    "sort_row_avg": (sort_matrix_by_row_avg, False),
+    "add_vector": (lambda m: add_vector_to_rows(m, m[:1]), False),
+}
+
+# name -> (function of a (B, N, M) stack, needs square matrices)
+BATCH_OPERATIONS = {
+    "determinant_batch": (calculate_determinant_batch, True),
+    "inverse_batch": (inverse_matrix_batch, True),
+    "rank_batch": (calculate_rank_batch, False),
+    "svd_batch": (singular_value_decomposition_batch, False),
+}
+
+
+def measure(function, repeat, min_time):
+    # One untimed call first, so one-off costs such as SciPy's lazy import stay out of the
+    # calibration. Loops per timing sample are then chosen like timeit's autorange so small
+    # cases are not noise.
+    function()
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    samples = [elapsed / number] + [t / number for t in timer.repeat(repeat - 1, number)]
+
+    # Peak of the Python and NumPy allocations during one call; LAPACK's own workspaces are not traced
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"best_s": min(samples), "median_s": float(np.median(samples)), "number": number,
+            "peak_bytes": max(0, peak - baseline)}
+
+
+def run_benchmarks(sizes, shapes, dtypes, batches, operations, repeat=5, min_time=0.05, max_batch_size=100,
+                   progress=None):
+    rng = np.random.default_rng(0)
+    results = []
+    for dtype in dtypes:
+        # Determinants of large random matrices overflow by design; that is not what is measured
+        with precision(dtype), np.errstate(over="ignore", under="ignore"):
+            for size in sizes:
+                for shape_kind in shapes:
+                    N, M = SHAPES[shape_kind](size)
+                    matrix = generate_matrix(N, M, rng=rng).astype(dtype)
+                    cases = [(name, 1, OPERATIONS[name]) for name in operations if name in OPERATIONS]
+                    if size <= max_batch_size:
+                        cases += [(name, batch, BATCH_OPERATIONS[name]) for name in operations
+                                  if name in BATCH_OPERATIONS for batch in batches]
+                    for name, batch, (function, square_only) in cases:
+                        if square_only and N != M:
+                            continue
+                        if name in BATCH_OPERATIONS:
+                            data = generate_matrix(batch * N, M, rng=rng).astype(dtype).reshape(batch, N, M)
+                        else:
+                            data = matrix
+                        record = {"operation": name, "shape_kind": shape_kind, "shape": [N, M],
+                                  "dtype": dtype, "batch": batch}
+                        record.update(measure(lambda: function(data), repeat, min_time))
+                        results.append(record)
+                        if progress:
+                            progress(record)
+    return results
+
+
+def _case_key(record):
+    return record["operation"], tuple(record["shape"]), record["dtype"], record["batch"]
+
+
+def compare(results, baseline, threshold):
+    # A case regresses when its best time is more than threshold slower than in the baseline
+    previous = {_case_key(record): record for record in baseline["results"]}
+    comparison = []
+    for record in results:
+        old = previous.get(_case_key(record))
+        if old is None:
+            continue
+        ratio = record["best_s"] / old["best_s"] if old["best_s"] else float("inf")
+        comparison.append({"operation": record["operation"], "shape": record["shape"],
+                           "dtype": record["dtype"], "batch": record["batch"], "ratio": ratio,
+                           "memory_ratio": record["peak_bytes"] / old["peak_bytes"] if old["peak_bytes"] else None,
+                           "regression": ratio > 1 + threshold})
+    return comparison
+
+
+def environment():
+    return {"python": sys.version.split()[0], "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(), "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+def _format(record):
+    shape = "x".join(map(str, record["shape"]))
+    batch = f" B={record['batch']}" if record["batch"] > 1 or record["operation"] in BATCH_OPERATIONS else ""
+    return (f"{record['operation']:<18} {record['shape_kind']:<6} {shape:>11}{batch:<7} {record['dtype']:<8} "
+            f"{record['best_s'] * 1e3:12.4f} ms {record['peak_bytes'] / 2 ** 20:10.2f} MiB")
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def _str_list(text):
+    return [value.strip() for value in text.split(",") if value.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ex120.benchmarks",
+                                     description="Time the ex120 operations over a grid of shapes, dtypes and batch sizes.")
+    parser.add_argument("--sizes", type=_int_list, default=[10, 100, 1000],
+                        help="matrix sizes, e.g. 10,100,1000,10000 (default: 10,100,1000)")
+    parser.add_argument("--shapes", type=_str_list, default=list(SHAPES), help="square,tall,wide")
+    parser.add_argument("--dtypes", type=_str_list, default=["float32", "float64"])
+    parser.add_argument("--batches", type=_int_list, default=[1, 64], help="batch sizes for *_batch operations")
+    parser.add_argument("--max-batch-size", type=int, default=100,
+                        help="largest matrix size that is also benchmarked in batches")
+    parser.add_argument("--operations", type=_str_list, default=[*OPERATIONS, *BATCH_OPERATIONS])
+    parser.add_argument("--repeat", type=int, default=5, help="timing samples per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per timing sample")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown that counts as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.operations if name not in OPERATIONS and name not in BATCH_OPERATIONS]
+    unknown += [name for name in args.shapes if name not in SHAPES]
+    unknown += [name for name in args.dtypes if name not in ("float32", "float64")]
+    if unknown:
+        parser.error(f"unknown choices: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args.sizes, args.shapes, args.dtypes, args.batches, args.operations,
+                             args.repeat, args.min_time, args.max_batch_size,
+                             progress=lambda record: print(_format(record), flush=True))
+    report = {"environment": environment(), "results": results}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["comparison"] = compare(results, json.load(file), args.threshold)
+        regressions = [entry for entry in report["comparison"] if entry["regression"]]
+        print(f"\n{len(report['comparison'])} cases compared with {args.baseline}, {len(regressions)} regressions")
+        for entry in regressions:
+            print(f"  {entry['operation']} {entry['shape']} {entry['dtype']} B={entry['batch']}: "
+                  f"{entry['ratio']:.2f}x slower")
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import argparse
+import io
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+from ex120 import (STATUS_NOT_CONVERGED, STATUS_OK, MatrixResult, calculate_determinant,
+                   calculate_rank, inverse_matrix, singular_value_decomposition,
+                   sort_matrix_by_column, sort_matrix_by_row, sort_matrix_by_row_avg)
+from ex120.parallel import blas_limited_pool
+
+# Operations whose result is a matrix of the same shape feed the next step of the chain
+TRANSFORMS = {
+    "inverse": lambda m: inverse_matrix(m, as_result=True),
+    "sort_rows": lambda m: MatrixResult(sort_matrix_by_row(m), STATUS_OK),
+    "sort_columns": lambda m: MatrixResult(sort_matrix_by_column(m), STATUS_OK),
+    "sort_row_avg": lambda m: MatrixResult(sort_matrix_by_row_avg(m), STATUS_OK),
+}
+
+REDUCTIONS = {
+    "determinant": lambda m: calculate_determinant(m, as_result=True),
+    "logdet": lambda m: calculate_determinant(m, log=True, as_result=True),
+    "rank": lambda m: MatrixResult(calculate_rank(m), STATUS_OK),
+    "svd": lambda m: MatrixResult(singular_value_decomposition(m, full_matrices=False), STATUS_OK),
+}
+
+OPERATIONS = {**TRANSFORMS, **REDUCTIONS}
+
+# Recorded as <input>/status when an input file cannot be read or parsed
+STATUS_UNREADABLE = 4
+
+
+def load_matrices(label, source):
+    # source is a path, or the raw bytes read from stdin
+    if isinstance(source, bytes):
+        data = source
+    else:
+        with open(source, "rb") as file:
+            data = file.read()
+    if data.startswith(b"\x93NUMPY"):
+        arrays = {label: np.load(io.BytesIO(data))}
+    elif data.startswith(b"PK"):
+        with np.load(io.BytesIO(data)) as archive:
+            arrays = {f"{label}:{key}": archive[key] for key in archive.files}
+    else:
+        arrays = {label: np.loadtxt(io.StringIO(data.decode()), delimiter=",", ndmin=2)}
+
+    matrices = {}
+    for name, array in arrays.items():
+        if array.ndim == 2:
+            matrices[name] = array
+        elif array.ndim == 3:
+            matrices.update((f"{name}[{i}]", matrix) for i, matrix in enumerate(array))
+        else:
+            raise ValueError(f"{name}: expected a matrix or a stack of matrices, got shape {array.shape}")
+    return matrices
+
+
+def apply_operations(matrix, operations):
+    # Once a transform fails its output is meaningless, so the rest of the chain is not run
+    # and every remaining step carries the failed step's status
+    results = {}
+    upstream = STATUS_OK
+    for step, name in enumerate(operations):
+        key = f"{step}_{name}"
+        if upstream != STATUS_OK:
+            results[f"{key}/status"] = np.int8(upstream)
+            continue
+        try:
+            value, status = OPERATIONS[name](matrix)
+        except np.linalg.LinAlgError:
+            results[f"{key}/status"] = np.int8(STATUS_NOT_CONVERGED)
+            continue
+        if name == "svd":
+            results.update({f"{key}/U": value[0], f"{key}/S": value[1], f"{key}/V": value[2]})
+        elif name == "logdet":
+            results.update({f"{key}/sign": np.asarray(value[0]), f"{key}/logabsdet": np.asarray(value[1])})
+        else:
+            results[key] = np.asarray(value)
+        results[f"{key}/status"] = np.int8(status)
+        if name in TRANSFORMS:
+            matrix = value
+            upstream = status
+    return results
+
+
+def process_source(label, source, operations):
+    # Returns (results, error); an unreadable input is recorded in the results instead of
+    # stopping the batch
+    try:
+        matrices = load_matrices(label, source)
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile) as error:
+        message = f"{label}: {error}"
+        return {f"{label}/status": np.int8(STATUS_UNREADABLE), f"{label}/error": np.str_(message)}, message
+    results = {}
+    for name, matrix in matrices.items():
+        results.update((f"{name}/{key}", value) for key, value in apply_operations(matrix, operations).items())
+    return results, None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ex120.cli",
+        description="Apply a chain of ex120 operations to matrices read from .npy, .npz or CSV files.")
+    parser.add_argument("inputs", nargs="+", help="input files; '-' reads one file from stdin")
+    parser.add_argument("--ops", required=True,
+                        help=f"comma-separated operations applied in order: {', '.join(OPERATIONS)}")
+    parser.add_argument("-o", "--output", required=True, help="output .npz file")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: all cores; 1 runs in-process)")
+    parser.add_argument("--blas-threads", type=int, default=1,
+                        help="BLAS threads per worker process (default: 1)")
+    parser.add_argument("--compress", action="store_true", help="write a compressed .npz")
+    args = parser.parse_args(argv)
+
+    args.ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = [op for op in args.ops if op not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = [("stdin", sys.stdin.buffer.read()) if path == "-" else (path, path) for path in args.inputs]
+
+    if args.workers == 1 or len(jobs) == 1:
+        outcomes = [process_source(label, source, args.ops) for label, source in jobs]
+    else:
+        with blas_limited_pool(min(args.workers, len(jobs)), args.blas_threads) as pool:
+            futures = [pool.submit(process_source, label, source, args.ops) for label, source in jobs]
+            outcomes = [future.result() for future in futures]
+
+    results = {}
+    errors = []
+    for source_results, error in outcomes:
+        results.update(source_results)
+        if error is not None:
+            errors.append(error)
+            print(f"error: {error}", file=sys.stderr)
+
+    save = np.savez_compressed if args.compress else np.savez
+    save(args.output, **results)
+    print(f"Wrote {len(results)} arrays for {len(jobs)} inputs to {args.output}"
+          + (f"; {len(errors)} inputs could not be read" if errors else ""), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,781 @@
+import sys
+import warnings
+import weakref
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from ex120.profiling import profiled
+
+# Status codes reported by the as_result=True mode and by the *_batch functions
+STATUS_OK = 0
+STATUS_NOT_SQUARE = 1
+STATUS_SINGULAR = 2
+STATUS_NOT_CONVERGED = 3
+
+MatrixResult = namedtuple("MatrixResult", ["value", "status"])
+
+# Floating-point type every decomposition works in; integer inputs are cast to it once
+_precision = np.dtype(np.float64)
+
+def get_precision():
+    return _precision
+
+def set_precision(dtype):
+    global _precision
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError(f"Precision must be float32 or float64, got {dtype}.")
+    _precision = dtype
+
+@contextmanager
+def precision(dtype):
+    previous = _precision
+    set_precision(dtype)
+    try:
+        yield
+    finally:
+        set_precision(previous)
+
+def _working_dtype(array, dtype=None):
+    # Complex input keeps its imaginary part in the complex type of the same precision
+    dtype = np.dtype(dtype or _precision)
+    if dtype.kind == "f" and np.iscomplexobj(array):
+        return np.result_type(dtype, np.complex64)
+    return dtype
+
+def _as_float(array, dtype=None):
+    # No copy when the input already has the requested precision
+    return np.asarray(array, dtype=_working_dtype(array, dtype))
+
+def _phase_product(diagonal):
+    # Sign of prod(diagonal) without forming it: +-1 for real values, a unit complex number otherwise
+    if np.iscomplexobj(diagonal):
+        return np.prod(diagonal / np.abs(diagonal))
+    return -1.0 if np.count_nonzero(diagonal < 0) % 2 else 1.0
+
+@profiled
+def generate_matrix(N, M, rng=None, dtype=int):
+    if rng is None:
+        return np.random.randint(-100, 101, (N, M), dtype=dtype)
+    return np.random.default_rng(rng).integers(-100, 101, (N, M), dtype=dtype)
+
+# Not @profiled: a generator returns before doing any work
+def generate_matrix_chunks(N, M, chunk_rows=4096, rng=None, dtype=np.int8):
+    # Yields (chunk_rows, M) row blocks; int8 already covers the -100..100 range
+    rng = np.random.default_rng(rng)
+    for start in range(0, N, chunk_rows):
+        yield rng.integers(-100, 101, (min(chunk_rows, N - start), M), dtype=dtype)
+
+# SciPy is imported inside the functions that need it so that importing ex120 only costs NumPy
+
+class LUFactorization:
+    def __init__(self, matrix, dtype=None):
+        from scipy.linalg import LinAlgWarning, lu_factor
+
+        original = matrix
+        matrix = _as_float(matrix, dtype)
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            raise ValueError("LU factorization is only defined for square matrices.")
+        with warnings.catch_warnings():
+            # An exactly singular matrix still factors; is_singular() reports it
+            warnings.simplefilter("ignore", LinAlgWarning)
+            # LAPACK may overwrite the input only when the cast above made a private copy; an
+            # ndarray subclass (memmap, np.matrix) comes back as a view of the caller's data
+            private = not np.may_share_memory(matrix, original)
+            self.lu, self.piv = lu_factor(matrix, overwrite_a=private, check_finite=False)
+        self.shape = matrix.shape
+        self.diagonal = np.diagonal(self.lu)
+
+    def is_singular(self):
+        return not np.all(self.diagonal)
+
+    def determinant(self):
+        swaps = np.count_nonzero(self.piv != np.arange(self.piv.size))
+        with np.errstate(over="ignore", under="ignore"):
+            return (-1.0 if swaps % 2 else 1.0) * np.prod(self.diagonal)
+
+    def log_determinant(self):
+        # (sign, log|det|) like np.linalg.slogdet; sign is 0 and log|det| is -inf when singular
+        if self.is_singular():
+            return 0.0, -np.inf
+        swaps = np.count_nonzero(self.piv != np.arange(self.piv.size))
+        sign = (-1.0 if swaps % 2 else 1.0) * _phase_product(self.diagonal)
+        return sign, np.sum(np.log(np.abs(self.diagonal)))
+
+    def inverse(self):
+        return self.solve(np.eye(self.shape[0], dtype=self.lu.dtype))
+
+    def solve(self, rhs):
+        if self.is_singular():
+            raise np.linalg.LinAlgError("Singular matrix")
+        from scipy.linalg import lu_solve
+
+        return lu_solve((self.lu, self.piv), _as_float(rhs, self.lu.dtype), check_finite=False)
+
+    def rank(self, tol=None):
+        # Pivots of a partially pivoted LU only estimate the rank; use SVD when it must be exact
+        magnitudes = np.abs(self.diagonal)
+        if tol is None:
+            tol = magnitudes.max(initial=0.0) * self.shape[0] * np.finfo(self.lu.dtype).eps
+        return int(np.count_nonzero(magnitudes > tol))
+
+# Factorizations kept for reuse, least recently used first. Their LU factors together stay
+# within LU_CACHE_BYTES, the least recently used being dropped first; 0 turns the cache off.
+LU_CACHE_BYTES = 256 * 2 ** 20
+
+# id(matrix) -> (fingerprint, LUFactorization, finalizer); entries are dropped when the matrix is collected
+_lu_cache = OrderedDict()
+
+def _fingerprint(matrix):
+    # CRC of the data in memory order; only a matrix that is neither C- nor F-contiguous
+    # is copied, one row at a time
+    if matrix.flags.c_contiguous:
+        crc = zlib.crc32(matrix)
+    elif matrix.flags.f_contiguous:
+        crc = zlib.crc32(matrix.T)
+    else:
+        crc = 0
+        for row in matrix:
+            crc = zlib.crc32(np.ascontiguousarray(row), crc)
+    return matrix.shape, matrix.dtype.str, matrix.flags.c_contiguous, crc
+
+def _cache_factorization(matrix, fingerprint, factorization):
+    key = id(matrix)
+    cached = _lu_cache.pop(key, None)
+    if factorization.lu.nbytes > LU_CACHE_BYTES:
+        if cached is not None:
+            cached[2].detach()
+        return
+    finalizer = cached[2] if cached is not None else weakref.finalize(matrix, _lu_cache.pop, key, None)
+    _lu_cache[key] = (fingerprint, factorization, finalizer)
+    total = sum(entry[1].lu.nbytes for entry in _lu_cache.values())
+    while total > LU_CACHE_BYTES:
+        _, (_, evicted, evicted_finalizer) = _lu_cache.popitem(last=False)
+        evicted_finalizer.detach()
+        total -= evicted.lu.nbytes
+
+def _is_sparse(matrix):
+    # A scipy.sparse matrix can only exist once scipy.sparse has been imported
+    sparse = sys.modules.get("scipy.sparse")
+    return sparse is not None and sparse.issparse(matrix)
+
+def _require_dense(matrix, operation):
+    if _is_sparse(matrix):
+        raise TypeError(f"{operation} has no sparse implementation; "
+                        "pass to_dense(matrix) to densify explicitly.")
+
+@profiled
+def to_dense(matrix):
+    return matrix.toarray() if _is_sparse(matrix) else np.asarray(matrix)
+
+def _permutation_parity(permutation):
+    # Parity of a permutation is (length - number of cycles) mod 2
+    seen = np.zeros(permutation.size, dtype=bool)
+    cycles = 0
+    for start in range(permutation.size):
+        if not seen[start]:
+            cycles += 1
+            i = start
+            while not seen[i]:
+                seen[i] = True
+                i = permutation[i]
+    return (permutation.size - cycles) % 2
+
+class SparseLUFactorization:
+    # Same interface as LUFactorization, backed by SuperLU. There is no inverse(): the inverse
+    # of a sparse matrix is dense in general.
+    def __init__(self, matrix, dtype=None):
+        from scipy.sparse.linalg import splu
+
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            raise ValueError("LU factorization is only defined for square matrices.")
+        self.shape = matrix.shape
+        matrix = matrix.tocsc().astype(_working_dtype(matrix, dtype), copy=False)
+        try:
+            self.lu = splu(matrix)
+        except RuntimeError:
+            # SuperLU refuses to finish a factorization with an exactly zero pivot
+            self.lu = None
+            self.diagonal = np.zeros(self.shape[0])
+        else:
+            self.diagonal = self.lu.U.diagonal()
+
+    def is_singular(self):
+        return self.lu is None
+
+    def _permutation_sign(self):
+        odd = _permutation_parity(self.lu.perm_r) + _permutation_parity(self.lu.perm_c)
+        return -1.0 if odd % 2 else 1.0
+
+    def determinant(self):
+        if self.is_singular():
+            return 0.0
+        with np.errstate(over="ignore", under="ignore"):
+            return self._permutation_sign() * np.prod(self.diagonal)
+
+    def log_determinant(self):
+        if self.is_singular():
+            return 0.0, -np.inf
+        sign = self._permutation_sign() * _phase_product(self.diagonal)
+        return sign, np.sum(np.log(np.abs(self.diagonal)))
+
+    def solve(self, rhs):
+        if self.is_singular():
+            raise np.linalg.LinAlgError("Singular matrix")
+        return self.lu.solve(_as_float(rhs, self.lu.U.dtype))
+
+@profiled
+def lu_factorize(matrix, dtype=None):
+    if _is_sparse(matrix):
+        return SparseLUFactorization(matrix, dtype)
+    if not isinstance(matrix, np.ndarray):
+        return LUFactorization(matrix, dtype)
+    if not LU_CACHE_BYTES:
+        return LUFactorization(matrix, dtype)
+    key = id(matrix)
+    fingerprint = _fingerprint(matrix)
+    cached = _lu_cache.get(key)
+    if cached is not None and cached[0] == fingerprint and cached[1].lu.dtype == _working_dtype(matrix, dtype):
+        _lu_cache.move_to_end(key)
+        return cached[1]
+    factorization = LUFactorization(matrix, dtype)
+    _cache_factorization(matrix, fingerprint, factorization)
+    return factorization
+
+@profiled
+def calculate_determinant(matrix, log=False, as_result=False):
+    if matrix.shape[0] == matrix.shape[1]:
+        factorization = lu_factorize(matrix)
+        determinant = factorization.log_determinant() if log else factorization.determinant()
+        return MatrixResult(determinant, STATUS_OK) if as_result else determinant
+    else:
+        if as_result:
+            return MatrixResult((np.nan, np.nan) if log else np.nan, STATUS_NOT_SQUARE)
+        return "Determinant is only defined for square matrices."
+
+def _refined_solve(matrix, rhs, factorization, max_iterations=10):
+    # Mixed-precision iterative refinement: the O(N^3) factorization runs in float32 and each
+    # O(N^2) step corrects the solution with a float64 residual
+    if matrix is None:
+        raise ValueError("refine=True needs the matrix itself to compute residuals.")
+    rhs = _as_float(rhs, np.float64)
+    solution = factorization.solve(rhs)
+    solution = solution.astype(np.result_type(solution, np.float64))
+    eps = np.finfo(np.float64).eps
+    for _ in range(max_iterations):
+        correction = factorization.solve(rhs - matrix @ solution)
+        solution += correction
+        if np.max(np.abs(correction), initial=0.0) <= eps * np.max(np.abs(solution), initial=0.0):
+            break
+    return solution
+
+@profiled
+def inverse_matrix(matrix, as_result=False, refine=False):
+    _require_dense(matrix, "inverse_matrix")
+    if matrix.shape[0] == matrix.shape[1]:
+        try:
+            if refine:
+                factorization = lu_factorize(matrix, np.float32)
+                inverse = _refined_solve(matrix, np.eye(matrix.shape[0]), factorization)
+            else:
+                inverse = lu_factorize(matrix).inverse()
+            return MatrixResult(inverse, STATUS_OK) if as_result else inverse
+        except np.linalg.LinAlgError:
+            if as_result:
+                return MatrixResult(np.full(matrix.shape, np.nan, dtype=_precision), STATUS_SINGULAR)
+            return "Matrix is singular and cannot be inverted."
+    else:
+        if as_result:
+            return MatrixResult(np.full(matrix.shape, np.nan, dtype=_precision), STATUS_NOT_SQUARE)
+        return "Inverse is only defined for square matrices."
+
+@profiled
+def solve_system(matrix, rhs, factorization=None, as_result=False, refine=False):
+    _require_dense(rhs, "solve_system with a sparse right-hand side")
+    rhs = np.asarray(rhs)
+    if factorization is None and matrix.shape[0] == matrix.shape[1]:
+        factorization = lu_factorize(matrix, np.float32 if refine else None)
+    if factorization is not None:
+        try:
+            if refine:
+                solution = _refined_solve(matrix, rhs, factorization)
+            else:
+                solution = factorization.solve(rhs)
+            return MatrixResult(solution, STATUS_OK) if as_result else solution
+        except np.linalg.LinAlgError:
+            if as_result:
+                return MatrixResult(np.full(rhs.shape, np.nan, dtype=_precision), STATUS_SINGULAR)
+            return "Matrix is singular and the system cannot be solved."
+    else:
+        if as_result:
+            return MatrixResult(np.full(rhs.shape, np.nan, dtype=_precision), STATUS_NOT_SQUARE)
+        return "Solving is only defined for square matrices."
+
+# Memory-mapped matrices are processed in blocks of roughly this many bytes
+BLOCK_BYTES = 64 * 2 ** 20
+
+@profiled
+def create_matrix_file(path, N, M, dtype=np.int16, rng=None, chunk_rows=4096):
+    matrix = empty_matrix_file(path, (N, M), dtype)
+    start = 0
+    for block in generate_matrix_chunks(N, M, chunk_rows, rng, dtype):
+        matrix[start:start + len(block)] = block
+        start += len(block)
+    matrix.flush()
+    return matrix
+
+@profiled
+def empty_matrix_file(path, shape, dtype):
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+@profiled
+def open_matrix_file(path, mode="r+"):
+    return np.load(path, mmap_mode=mode)
+
+def _row_blocks(matrix):
+    step = max(1, BLOCK_BYTES // max(1, matrix.shape[1] * matrix.itemsize))
+    for start in range(0, matrix.shape[0], step):
+        yield slice(start, start + step)
+
+def _column_blocks(matrix):
+    step = max(1, BLOCK_BYTES // max(1, matrix.shape[0] * matrix.itemsize))
+    for start in range(0, matrix.shape[1], step):
+        yield slice(start, start + step)
+
+def _resolve_out(matrix, out, inplace):
+    if not inplace:
+        return out
+    if out is not None and out is not matrix:
+        raise ValueError("Pass either out= or inplace=True, not both.")
+    return matrix
+
+def _output_for(matrix, out, dtype=None):
+    if out is None:
+        return np.empty(matrix.shape, dtype=dtype or matrix.dtype)
+    if out.shape != matrix.shape:
+        raise ValueError(f"out has shape {out.shape}, expected {matrix.shape}.")
+    return out
+
+def _flush(out):
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+def _sorted_indices(values, k, axis, largest):
+    # Indices of the k smallest (or largest) entries along axis, in sorted order; ties keep
+    # their original order. argpartition finds the k-th value in O(n) and only the k selected
+    # entries are then sorted, so the cost is O(n + k log k).
+    keys = _descending_key(values) if largest else values
+    n = keys.shape[axis]
+    k = n if k is None else min(k, n)
+    if k == 0:
+        return np.empty(keys.shape[:axis] + (0,) + keys.shape[axis + 1:], dtype=np.intp)
+    if k == n:
+        return np.argsort(keys, axis=axis, kind="stable")
+    threshold = np.take(np.partition(keys, k - 1, axis=axis), [k - 1], axis=axis)
+    # Everything below the k-th value, then the earliest entries equal to it
+    below = keys < threshold
+    tied = keys == threshold
+    selected = below | (tied & (np.cumsum(tied, axis=axis) <= k - below.sum(axis=axis, keepdims=True)))
+    chosen = np.argsort(~selected, axis=axis, kind="stable").take(np.arange(k), axis=axis)
+    order = np.argsort(np.take_along_axis(keys, chosen, axis), axis=axis, kind="stable")
+    return np.take_along_axis(chosen, order, axis)
+
+def _partial_sort(matrix, axis, k, largest, return_indices):
+    if not isinstance(matrix, np.memmap):
+        blocks = [slice(None)]
+    else:
+        blocks = _row_blocks(matrix) if axis == 1 else _column_blocks(matrix)
+    pieces = []
+    for block in blocks:
+        values = matrix[block] if axis == 1 else matrix[:, block]
+        indices = _sorted_indices(values, k, axis, largest)
+        pieces.append(indices if return_indices else np.take_along_axis(values, indices, axis))
+    return np.concatenate(pieces, axis=1 - axis)
+
+def _check_partial_sort(out, inplace):
+    if out is not None or inplace:
+        raise ValueError("out= and inplace= only apply to full ascending sorts that return values.")
+
+def _sparse_sort_rows(matrix):
+    # Sorting a row of a sparse matrix only moves its stored values: negatives go to the left
+    # edge, positives to the right edge and the implicit zeros stay in between
+    csr = matrix.tocsr(copy=True)
+    csr.sum_duplicates()
+    csr.eliminate_zeros()
+    counts = np.repeat(np.diff(csr.indptr), np.diff(csr.indptr))
+    rows = np.repeat(np.arange(csr.shape[0]), np.diff(csr.indptr))
+    order = np.lexsort((csr.data, rows))
+    data = csr.data[order]
+    position = np.arange(data.size) - np.repeat(csr.indptr[:-1], np.diff(csr.indptr))
+    indices = np.where(data < 0, position, csr.shape[1] - counts + position)
+    return type(csr)((data, indices, csr.indptr), shape=csr.shape)
+
+def _check_sparse_sort(out, inplace, k, largest, return_indices):
+    if out is not None or inplace or k is not None or largest or return_indices:
+        raise TypeError("Sparse matrices only support the plain ascending sort.")
+
+@profiled
+def sort_matrix_by_row(matrix, out=None, inplace=False, k=None, largest=False, return_indices=False):
+    if _is_sparse(matrix):
+        _check_sparse_sort(out, inplace, k, largest, return_indices)
+        return _sparse_sort_rows(matrix)
+    if k is not None or largest or return_indices:
+        _check_partial_sort(out, inplace)
+        return _partial_sort(matrix, 1, k, largest, return_indices)
+    out = _resolve_out(matrix, out, inplace)
+    if out is None and not isinstance(matrix, np.memmap):
+        return np.sort(matrix, axis=1)
+    out = _output_for(matrix, out)
+    for rows in _row_blocks(matrix):
+        if out is not matrix:
+            out[rows] = matrix[rows]
+        out[rows].sort(axis=1)
+    return _flush(out)
+
+@profiled
+def sort_matrix_by_column(matrix, out=None, inplace=False, k=None, largest=False, return_indices=False):
+    if _is_sparse(matrix):
+        _check_sparse_sort(out, inplace, k, largest, return_indices)
+        return _sparse_sort_rows(matrix.T).T
+    if k is not None or largest or return_indices:
+        _check_partial_sort(out, inplace)
+        return _partial_sort(matrix, 0, k, largest, return_indices)
+    out = _resolve_out(matrix, out, inplace)
+    if out is None and not isinstance(matrix, np.memmap):
+        return np.sort(matrix, axis=0)
+    out = _output_for(matrix, out)
+    for cols in _column_blocks(matrix):
+        if out is not matrix:
+            out[:, cols] = matrix[:, cols]
+        out[:, cols].sort(axis=0)
+    return _flush(out)
+
+def _row_reduce(matrix, reduce):
+    if not isinstance(matrix, np.memmap):
+        return reduce(matrix)
+    return np.concatenate([reduce(matrix[rows]) for rows in _row_blocks(matrix)])
+
+def _row_means(matrix):
+    if _is_sparse(matrix):
+        return np.asarray(matrix.sum(axis=1)).ravel() / matrix.shape[1]
+    return _row_reduce(matrix, lambda block: np.mean(block, axis=1))
+
+ROW_STATISTICS = {
+    "mean": lambda block: np.mean(block, axis=1),
+    "sum": lambda block: np.sum(block, axis=1),
+    "max": lambda block: np.max(block, axis=1),
+    "min": lambda block: np.min(block, axis=1),
+    "norm": lambda block: np.linalg.norm(block, axis=1),
+}
+
+class RowStatistics:
+    # Per-row statistics of one matrix, computed on first use and then reused. Keys are the
+    # names in ROW_STATISTICS or a column index. Call clear() after editing the matrix.
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if isinstance(key, (int, np.integer)):
+                self._values[key] = np.array(self.matrix[:, key])
+            elif key in ROW_STATISTICS:
+                self._values[key] = _row_reduce(self.matrix, ROW_STATISTICS[key])
+            else:
+                raise KeyError(f"Unknown row statistic: {key!r}")
+        return self._values[key]
+
+    def clear(self):
+        self._values.clear()
+
+    def reorder(self, order):
+        # Follows an in-place row reordering of the matrix, so the cache stays valid
+        for values in self._values.values():
+            values[:] = values[order]
+
+def _permute_rows_inplace(matrix, order):
+    # matrix[i] <- matrix[order[i]], following each cycle of the permutation with one spare row
+    done = np.zeros(len(order), dtype=bool)
+    for start in np.flatnonzero(order != np.arange(len(order))):
+        if done[start]:
+            continue
+        saved = matrix[start].copy()
+        i = start
+        while order[i] != start:
+            matrix[i] = matrix[order[i]]
+            done[i] = True
+            i = order[i]
+        matrix[i] = saved
+        done[i] = True
+
+def _apply_row_order(matrix, sorted_indices, out):
+    if out is None and not isinstance(matrix, np.memmap):
+        return matrix[sorted_indices]
+    if out is matrix:
+        _permute_rows_inplace(matrix, sorted_indices)
+        return _flush(matrix)
+    out = _output_for(matrix, out)
+    for rows in _row_blocks(matrix):
+        out[rows] = matrix[sorted_indices[rows]]
+    return _flush(out)
+
+@profiled
+def sort_matrix_by_row_avg(matrix, out=None, inplace=False, k=None, largest=False, return_indices=False,
+                           stats=None):
+    row_avg = stats["mean"] if stats is not None else _row_means(matrix)
+    if _is_sparse(matrix):
+        matrix = matrix.tocsr()
+    if k is not None or largest or return_indices or _is_sparse(matrix):
+        _check_partial_sort(out, inplace)
+        sorted_indices = _sorted_indices(row_avg, k, 0, largest)
+        return sorted_indices if return_indices else matrix[sorted_indices]
+    out = _resolve_out(matrix, out, inplace)
+    sorted_indices = np.argsort(row_avg, kind="stable")
+    if out is matrix and stats is not None:
+        stats.reorder(sorted_indices)
+    return _apply_row_order(matrix, sorted_indices, out)
+
+def _descending_key(values):
+    # Order-reversing without overflow: ~x == -x - 1 for every integer dtype
+    return -values if values.dtype.kind in "fc" else ~values
+
+@profiled
+def sort_rows_by(matrix, keys=("mean",), descending=False, stats=None, out=None, inplace=False,
+                 return_indices=False):
+    # keys are row statistic names, column indices or length-N arrays; the first key is the
+    # primary one and later keys only break its ties. Rows that tie on every key keep their order.
+    _require_dense(matrix, "sort_rows_by")
+    stats = stats if stats is not None else RowStatistics(matrix)
+    if isinstance(keys, (str, int, np.integer, np.ndarray)):
+        keys = [keys]
+    if isinstance(descending, bool):
+        descending = [descending] * len(keys)
+    if len(descending) != len(keys):
+        raise ValueError(f"Got {len(keys)} sort keys but {len(descending)} descending flags.")
+    columns = []
+    for key, reverse in zip(keys, descending):
+        values = np.asarray(key) if isinstance(key, (np.ndarray, list)) else stats[key]
+        if values.shape != (matrix.shape[0],):
+            raise ValueError(f"Sort key has shape {values.shape}, expected ({matrix.shape[0]},).")
+        columns.append(_descending_key(values) if reverse else values)
+    sorted_indices = np.lexsort(columns[::-1])
+    if return_indices:
+        _check_partial_sort(out, inplace)
+        return sorted_indices
+    out = _resolve_out(matrix, out, inplace)
+    if out is matrix:
+        stats.reorder(sorted_indices)
+    return _apply_row_order(matrix, sorted_indices, out)
+
+@profiled
+def modify_element(matrix, row, col, new_value, inplace=True):
+    if not inplace:
+        matrix = matrix.copy() if _is_sparse(matrix) else np.array(matrix)
+    matrix[row, col] = new_value
+    return _flush(matrix)
+
+@profiled
+def modify_column(matrix, col, inplace=True):
+    _require_dense(matrix, "modify_column")
+    if not inplace:
+        matrix = np.array(matrix)
+    if isinstance(matrix, np.memmap):
+        for rows in _row_blocks(matrix):
+            matrix[rows, col] += 2
+        return _flush(matrix)
+    matrix[:, col] += 2
+    return matrix
+
+def _sparse_add_vector(matrix, vector):
+    # Only the columns where the vector is non-zero fill in, so a sparse vector keeps the
+    # result sparse
+    from scipy import sparse
+
+    vector = to_dense(vector).ravel()
+    flavour = sparse.csr_matrix if isinstance(matrix, sparse.spmatrix) else sparse.csr_array
+    ones = flavour(np.ones((matrix.shape[0], 1), dtype=vector.dtype))
+    return matrix.tocsr() + ones @ flavour(vector[np.newaxis, :])
+
+@profiled
+def add_vector_to_rows(matrix, vector, out=None, inplace=False):
+    if _is_sparse(matrix):
+        if out is not None or inplace:
+            raise TypeError("out= and inplace= are not supported for sparse matrices.")
+        return _sparse_add_vector(matrix, vector)
+    out = _resolve_out(matrix, out, inplace)
+    if out is None and not isinstance(matrix, np.memmap):
+        return matrix + vector
+    vector = np.asarray(vector)
+    out = _output_for(matrix, out, dtype=np.result_type(matrix, vector))
+    for rows in _row_blocks(matrix):
+        np.add(matrix[rows], vector, out=out[rows])
+    return _flush(out)
+
+@profiled
+def rank_from_singular_values(S, shape, tol=None):
+    # Same default tolerance as np.linalg.matrix_rank; S may hold one matrix or a stack
+    S = np.asarray(S)
+    if tol is None:
+        tol = S.max(axis=-1, keepdims=True, initial=0.0) * max(shape[-2:]) * np.finfo(S.dtype).eps
+    else:
+        tol = np.asarray(tol)[..., np.newaxis]
+    return np.count_nonzero(S > tol, axis=-1)
+
+@profiled
+def calculate_rank(matrix, tol=None, method="svd", svd=None):
+    # svd= takes an earlier (U, S, V) result or just S; a truncated SVD only bounds the rank by k
+    if svd is not None:
+        S = svd[1] if isinstance(svd, tuple) else svd
+        return int(rank_from_singular_values(S, matrix.shape, tol))
+    _require_dense(matrix, "calculate_rank")
+    if method == "svd":
+        return int(np.linalg.matrix_rank(_as_float(matrix), tol=tol))
+    if method == "qr":
+        # Column-pivoted QR is rank revealing and skips the SVD iterations
+        from scipy.linalg import qr
+
+        R, _ = qr(_as_float(matrix), mode="r", pivoting=True, check_finite=False)
+        magnitudes = np.abs(np.diagonal(R))
+        if tol is None:
+            tol = magnitudes.max(initial=0.0) * max(matrix.shape) * np.finfo(R.dtype).eps
+        return int(np.count_nonzero(magnitudes > tol))
+    raise ValueError(f"Unknown rank method: {method!r}")
+
+@profiled
+def singular_value_decomposition(matrix, k=None, full_matrices=True, method="exact",
+                                 oversamples=10, power_iterations=2, rng=None):
+    if method == "randomized":
+        if k is None:
+            raise ValueError("Randomized SVD needs the number of singular triplets k.")
+        return _randomized_svd(matrix, k, oversamples, power_iterations, rng)
+    if method != "exact":
+        raise ValueError(f"Unknown SVD method: {method!r}")
+    if _is_sparse(matrix):
+        return _sparse_svd(matrix, k)
+    U, S, V = np.linalg.svd(_as_float(matrix), full_matrices=full_matrices and k is None)
+    if k is not None:
+        U, S, V = U[:, :k], S[:k], V[:k]
+    return U, S, V
+
+def _sparse_svd(matrix, k):
+    from scipy.sparse.linalg import svds
+
+    if k is None:
+        raise TypeError("A full SVD of a sparse matrix is dense; pass k= for a truncated one "
+                        "or to_dense(matrix) to densify explicitly.")
+    U, S, V = svds(matrix.astype(_working_dtype(matrix), copy=False), k=k)
+    # svds returns the singular values in ascending order
+    return U[:, ::-1], S[::-1], V[::-1]
+
+def _randomized_svd(matrix, k, oversamples, power_iterations, rng):
+    # Randomized range finder (Halko, Martinsson & Tropp): only N x (k + p) and (k + p) x M
+    # intermediates are formed, never the full U or V
+    rng = np.random.default_rng(rng)
+    matrix = matrix.astype(_working_dtype(matrix), copy=False) if _is_sparse(matrix) else _as_float(matrix)
+    N, M = matrix.shape
+    size = min(k + oversamples, N, M)
+    adjoint = matrix.T.conj() if np.iscomplexobj(matrix) else matrix.T
+    Q, _ = np.linalg.qr(matrix @ rng.standard_normal((M, size), dtype=_precision))
+    for _ in range(power_iterations):
+        Q, _ = np.linalg.qr(adjoint @ Q)
+        Q, _ = np.linalg.qr(matrix @ Q)
+    U_small, S, V = np.linalg.svd(Q.T.conj() @ matrix, full_matrices=False)
+    return (Q @ U_small)[:, :k], S[:k], V[:k]
+
+SVDAccuracy = namedtuple("SVDAccuracy", ["residual", "optimal_residual", "max_singular_value_error"])
+
+@profiled
+def svd_accuracy(matrix, U, S, V):
+    # Errors relative to ||A||_F (residuals) and to the largest exact singular value
+    exact = np.linalg.svd(matrix, compute_uv=False)
+    k = S.size
+    norm = np.sqrt(np.sum(exact ** 2)) or 1.0
+    residual = np.linalg.norm(matrix - (U[:, :k] * S) @ V[:k]) / norm
+    optimal_residual = np.sqrt(np.sum(exact[k:] ** 2)) / norm
+    max_error = np.max(np.abs(S - exact[:k]), initial=0.0) / (exact[0] if exact.size and exact[0] else 1.0)
+    return SVDAccuracy(residual, optimal_residual, max_error)
+
+def _as_stack(matrices):
+    stack = _as_float(matrices)
+    if stack.ndim != 3:
+        raise ValueError("Expected a stack of matrices with shape (B, N, M).")
+    return stack
+
+def _nonsingular_mask(stack):
+    # slogdet reports sign 0 exactly when LU hits a zero pivot, i.e. when inv/solve would raise
+    sign, _ = np.linalg.slogdet(stack)
+    return sign != 0
+
+@profiled
+def calculate_determinant_batch(matrices, log=False):
+    stack = _as_stack(matrices)
+    B, N, M = stack.shape
+    if N != M:
+        values = (np.full(B, np.nan, dtype=stack.dtype), np.full(B, np.nan, dtype=stack.dtype)) if log else np.full(B, np.nan, dtype=stack.dtype)
+        return MatrixResult(values, np.full(B, STATUS_NOT_SQUARE, dtype=np.int8))
+    values = tuple(np.linalg.slogdet(stack)) if log else np.linalg.det(stack)
+    return MatrixResult(values, np.full(B, STATUS_OK, dtype=np.int8))
+
+@profiled
+def inverse_matrix_batch(matrices):
+    stack = _as_stack(matrices)
+    B, N, M = stack.shape
+    inverses = np.full((B, N, M), np.nan, dtype=stack.dtype)
+    if N != M:
+        return MatrixResult(inverses, np.full(B, STATUS_NOT_SQUARE, dtype=np.int8))
+    ok = _nonsingular_mask(stack)
+    if ok.any():
+        inverses[ok] = np.linalg.inv(stack[ok])
+    return MatrixResult(inverses, np.where(ok, STATUS_OK, STATUS_SINGULAR).astype(np.int8))
+
+@profiled
+def solve_system_batch(matrices, rhs):
+    stack = _as_stack(matrices)
+    B, N, M = stack.shape
+    rhs = np.asarray(rhs)
+    if rhs.ndim not in (2, 3) or rhs.shape[:2] != (B, N):
+        raise ValueError("Expected right-hand sides with shape (B, N) or (B, N, K).")
+    columns = rhs if rhs.ndim == 3 else rhs[..., np.newaxis]
+    solutions = np.full(columns.shape, np.nan, dtype=stack.dtype)
+    if N != M:
+        return MatrixResult(solutions.reshape(rhs.shape), np.full(B, STATUS_NOT_SQUARE, dtype=np.int8))
+    ok = _nonsingular_mask(stack)
+    if ok.any():
+        solutions[ok] = np.linalg.solve(stack[ok], columns[ok])
+    status = np.where(ok, STATUS_OK, STATUS_SINGULAR).astype(np.int8)
+    return MatrixResult(solutions.reshape(rhs.shape), status)
+
+@profiled
+def calculate_rank_batch(matrices, tol=None, svd=None):
+    stack = _as_stack(matrices)
+    status = np.full(stack.shape[0], STATUS_OK, dtype=np.int8)
+    if svd is not None:
+        S = svd[1] if isinstance(svd, tuple) else svd
+        return MatrixResult(rank_from_singular_values(S, stack.shape, tol), status)
+    return MatrixResult(np.linalg.matrix_rank(stack, tol=tol), status)
+
+@profiled
+def singular_value_decomposition_batch(matrices):
+    stack = _as_stack(matrices)
+    B, N, M = stack.shape
+    try:
+        U, S, V = np.linalg.svd(stack)
+        return MatrixResult((U, S, V), np.full(B, STATUS_OK, dtype=np.int8))
+    except np.linalg.LinAlgError:
+        pass
+    # Only reached when some SVD failed to converge: redo per matrix to find which
+    U = np.full((B, N, N), np.nan, dtype=stack.dtype)
+    S = np.full((B, min(N, M)), np.nan, dtype=stack.dtype)
+    V = np.full((B, M, M), np.nan, dtype=stack.dtype)
+    status = np.full(B, STATUS_NOT_CONVERGED, dtype=np.int8)
+    for i in range(B):
+        try:
+            U[i], S[i], V[i] = np.linalg.svd(stack[i])
+            status[i] = STATUS_OK
+        except np.linalg.LinAlgError:
+            pass
+    return MatrixResult((U, S, V), status)
@@ -0,0 +1,210 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from ex120 import (STATUS_NOT_CONVERGED, STATUS_OK, MatrixResult, calculate_determinant,
+                   calculate_rank, get_precision, inverse_matrix, set_precision,
+                   singular_value_decomposition)
+
+# Read by OpenBLAS, MKL, BLIS, Accelerate and OpenMP when NumPy loads them
+BLAS_THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                         "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+OPERATIONS = ("determinant", "inverse", "rank", "svd")
+
+_ALIGNMENT = 64
+
+
+class SharedArrays:
+    # Several arrays laid out back to back in one shared memory segment. Workers re-attach
+    # to the segment from descriptor(), so only the name and the shapes are ever pickled.
+    def __init__(self, specs, name=None):
+        self.specs = [(tuple(shape), np.dtype(dtype).str) for shape, dtype in specs]
+        self.offsets = []
+        size = 0
+        for shape, dtype in self.specs:
+            self.offsets.append(size)
+            nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            size += -(-nbytes // _ALIGNMENT) * _ALIGNMENT
+        if name is None:
+            self.shm = SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.shm = SharedMemory(name=name)
+
+    def descriptor(self):
+        return self.shm.name, self.specs
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, specs = descriptor
+        return cls(specs, name=name)
+
+    def arrays(self):
+        # Every view must be released before close()
+        return [np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                for (shape, dtype), offset in zip(self.specs, self.offsets)]
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _output_specs(operation, shape, dtype):
+    N, M = shape
+    # Complex matrices have complex determinants, inverses and singular vectors
+    value = "c16" if np.dtype(dtype).kind == "c" else "f8"
+    if operation == "determinant":
+        return [((), value), ((), "i1")]
+    if operation == "inverse":
+        return [((N, M), value), ((), "i1")]
+    if operation == "rank":
+        return [((), "i8"), ((), "i1")]
+    if operation == "svd":
+        K = min(N, M)
+        return [((N, K), value), ((K,), "f8"), ((K, M), value), ((), "i1")]
+    raise ValueError(f"Unknown operation: {operation!r}")
+
+
+def _compute(operation, matrix):
+    if operation == "determinant":
+        value, status = calculate_determinant(matrix, as_result=True)
+        return [value], status
+    if operation == "inverse":
+        value, status = inverse_matrix(matrix, as_result=True)
+        return [value], status
+    try:
+        if operation == "rank":
+            return [calculate_rank(matrix)], STATUS_OK
+        return list(singular_value_decomposition(matrix, full_matrices=False)), STATUS_OK
+    except np.linalg.LinAlgError:
+        return None, STATUS_NOT_CONVERGED
+
+
+def _run_shard(operation, precision, inputs_descriptor, outputs_descriptor, indices):
+    # Spawned workers start with the default precision, so the caller's is passed along
+    set_precision(precision)
+    inputs = SharedArrays.attach(inputs_descriptor)
+    outputs = SharedArrays.attach(outputs_descriptor)
+    matrices = inputs.arrays()
+    results = outputs.arrays()
+    width = len(results) // len(matrices)
+    for i in indices:
+        values, status = _compute(operation, matrices[i])
+        slots = results[i * width:(i + 1) * width]
+        for slot, value in zip(slots[:-1], values or ()):
+            slot[...] = value
+        if values is None:
+            for slot in slots[:-1]:
+                slot[...] = np.nan if slot.dtype.kind == "f" else -1
+        slots[-1][...] = status
+        del slots
+    del matrices, results
+    inputs.close()
+    outputs.close()
+
+
+_startup_barrier = None
+
+
+def _init_worker(barrier):
+    global _startup_barrier
+    _startup_barrier = barrier
+
+
+def _wait_for_pool():
+    # Holds each worker busy until all of them are running, so every startup task gets a new process
+    _startup_barrier.wait()
+
+
+@contextmanager
+def _blas_environment(blas_threads):
+    saved = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+    os.environ.update((name, str(blas_threads)) for name in BLAS_THREAD_VARIABLES)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def blas_limited_pool(workers, blas_threads=1):
+    # A spawn-context process pool whose workers all run BLAS with blas_threads threads each
+    context = get_context("spawn")
+    with _blas_environment(blas_threads):
+        pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                   initargs=(context.Barrier(workers),))
+        # The pool spawns workers on demand, and each one inherits the environment of that
+        # moment. One blocking task per worker starts them all while the BLAS variables are set.
+        for future in [pool.submit(_wait_for_pool) for _ in range(workers)]:
+            future.result()
+    return pool
+
+
+class MatrixExecutor:
+    def __init__(self, workers=None, blas_threads=1):
+        self.workers = workers or os.cpu_count()
+        self.blas_threads = blas_threads
+        self._pool = blas_limited_pool(self.workers, blas_threads)
+
+    def map(self, operation, matrices, shards_per_worker=4):
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation!r}")
+        matrices = [np.asarray(matrix) for matrix in matrices]
+        if not matrices:
+            return []
+        for matrix in matrices:
+            if matrix.ndim != 2:
+                raise ValueError(f"Expected 2-D matrices, got shape {matrix.shape}.")
+
+        inputs = SharedArrays([(matrix.shape, matrix.dtype) for matrix in matrices])
+        outputs = None
+        try:
+            views = inputs.arrays()
+            for view, matrix in zip(views, matrices):
+                view[...] = matrix
+            del views
+
+            specs = [_output_specs(operation, matrix.shape, matrix.dtype) for matrix in matrices]
+            width = len(specs[0])
+            outputs = SharedArrays([spec for matrix_specs in specs for spec in matrix_specs])
+            shards = np.array_split(np.arange(len(matrices)), min(len(matrices), self.workers * shards_per_worker))
+            futures = [self._pool.submit(_run_shard, operation, get_precision(), inputs.descriptor(),
+                                         outputs.descriptor(), shard.tolist()) for shard in shards]
+            for future in futures:
+                future.result()
+
+            views = outputs.arrays()
+            results = []
+            for i in range(len(matrices)):
+                slots = views[i * width:(i + 1) * width]
+                values = [np.array(slot) if slot.ndim else slot[()] for slot in slots[:-1]]
+                value = tuple(values) if operation == "svd" else values[0]
+                results.append(MatrixResult(value, int(slots[-1])))
+            del views, slots
+            return results
+        finally:
+            inputs.close(unlink=True)
+            if outputs is not None:
+                outputs.close(unlink=True)
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parallel_map(operation, matrices, workers=None, blas_threads=1):
+    with MatrixExecutor(workers, blas_threads) as executor:
+        return executor.map(operation, matrices)
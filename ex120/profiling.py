@@ -0,0 +1,142 @@
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Every public ex120 operation is wrapped with @profiled. While profiling is disabled the
+# wrapper only checks _enabled and calls straight through.
+_enabled = False
+_track_memory = False
+_started_tracemalloc = False
+
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+
+
+def enable(track_memory=False):
+    # track_memory=True records the tracemalloc peak of each call, at the usual tracemalloc cost
+    global _enabled, _track_memory, _started_tracemalloc
+    _track_memory = track_memory
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _enabled = True
+
+
+def disable():
+    global _enabled, _track_memory, _started_tracemalloc
+    _enabled = False
+    _track_memory = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def stats():
+    with _lock:
+        return {name: {"calls": entry["calls"], "total_seconds": entry["total_seconds"],
+                       "allocated_bytes": entry["allocated_bytes"], "shapes": dict(entry["shapes"])}
+                for name, entry in _stats.items()}
+
+
+def to_json(indent=2):
+    return json.dumps(stats(), indent=indent)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def to_prometheus(prefix="ex120"):
+    snapshot = stats()
+    metrics = [
+        ("calls_total", "counter", "Calls per ex120 function.", "calls"),
+        ("seconds_total", "counter", "Cumulative wall time per ex120 function.", "total_seconds"),
+        ("allocated_bytes_total", "counter",
+         "Sum of per-call peak traced allocations per ex120 function.", "allocated_bytes"),
+    ]
+    lines = []
+    for suffix, kind, help_text, field in metrics:
+        lines += [f"# HELP {prefix}_{suffix} {help_text}", f"# TYPE {prefix}_{suffix} {kind}"]
+        lines += [f'{prefix}_{suffix}{{function="{_label(name)}"}} {entry[field]}'
+                  for name, entry in sorted(snapshot.items())]
+    lines += [f"# HELP {prefix}_input_shape_calls_total Calls per ex120 function and input shape.",
+              f"# TYPE {prefix}_input_shape_calls_total counter"]
+    lines += [f'{prefix}_input_shape_calls_total{{function="{_label(name)}",shape="{_label(shape)}"}} {count}'
+              for name, entry in sorted(snapshot.items()) for shape, count in sorted(entry["shapes"].items())]
+    return "\n".join(lines) + "\n"
+
+
+def dump(path, format="json"):
+    text = to_prometheus() if format == "prometheus" else to_json()
+    with open(path, "w") as file:
+        file.write(text)
+
+
+def _input_shape(args):
+    for arg in args:
+        shape = getattr(arg, "shape", None)
+        if shape is not None:
+            return "x".join(map(str, shape))
+    return "-"
+
+
+def _record(name, elapsed, shape, allocated):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = {"calls": 0, "total_seconds": 0.0, "allocated_bytes": 0, "shapes": Counter()}
+        entry["calls"] += 1
+        entry["total_seconds"] += elapsed
+        entry["allocated_bytes"] += allocated
+        entry["shapes"][shape] += 1
+
+
+def _call(name, func, args, kwargs):
+    shape = _input_shape(args)
+    measure = _track_memory and tracemalloc.is_tracing()
+    if measure:
+        # Nested profiled calls reset the tracemalloc peak, so each level keeps the highest peak
+        # seen so far on a per-thread stack and hands it up when it returns
+        peaks = _local.__dict__.setdefault("peaks", [])
+        start_bytes, peak_so_far = tracemalloc.get_traced_memory()
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak_so_far)
+        tracemalloc.reset_peak()
+        peaks.append(0)
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        allocated = 0
+        if measure:
+            peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            allocated = max(0, peak - start_bytes)
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+        _record(name, elapsed, shape, allocated)
+
+
+def profiled(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        return _call(name, func, args, kwargs)
+
+    return wrapper
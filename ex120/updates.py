@@ -0,0 +1,69 @@
+import numpy as np
+
+from ex120 import LUFactorization
+
+
+class TrackedMatrix:
+    # Keeps the determinant (as sign and log|det|) and the inverse of a square matrix current
+    # across modify_element / modify_column edits. Each edit is a rank-1 update A + u e_col^T,
+    # applied in O(N^2) with the matrix determinant lemma and Sherman-Morrison. Every
+    # refactor_every updates, or when an update nearly hits a singular matrix, everything is
+    # recomputed from a fresh LU factorization to stop rounding errors from accumulating.
+    def __init__(self, matrix, refactor_every=64, tolerance=1e-10):
+        self.matrix = np.array(matrix, dtype=float)
+        if self.matrix.ndim != 2 or self.matrix.shape[0] != self.matrix.shape[1]:
+            raise ValueError("TrackedMatrix needs a square matrix.")
+        self.refactor_every = refactor_every
+        self.tolerance = tolerance
+        self.refactor()
+
+    def refactor(self):
+        factorization = LUFactorization(self.matrix)
+        self.sign, self.log_abs_det = factorization.log_determinant()
+        self._inverse = None if factorization.is_singular() else factorization.inverse()
+        self.updates_since_refactor = 0
+
+    def is_singular(self):
+        return self._inverse is None
+
+    @property
+    def determinant(self):
+        return self.sign * np.exp(self.log_abs_det)
+
+    @property
+    def inverse(self):
+        if self._inverse is None:
+            raise np.linalg.LinAlgError("Singular matrix")
+        return self._inverse
+
+    def solve(self, rhs):
+        return self.inverse @ np.asarray(rhs)
+
+    def modify_element(self, row, col, new_value):
+        delta = new_value - self.matrix[row, col]
+        self.matrix[row, col] = new_value
+        if delta:
+            # A^-1 u for u = delta * e_row is just a scaled column of the inverse
+            self._update(col, lambda: delta * self._inverse[:, row])
+        return self
+
+    def modify_column(self, col, delta=2):
+        self.matrix[:, col] += delta
+        if delta:
+            self._update(col, lambda: delta * self._inverse.sum(axis=1))
+        return self
+
+    def _update(self, col, inverse_times_u):
+        # self.matrix already holds the edited values; only the cached results are updated here
+        if self._inverse is None or self.updates_since_refactor >= self.refactor_every:
+            self.refactor()
+            return
+        w = inverse_times_u()
+        factor = 1.0 + w[col]
+        if abs(factor) < self.tolerance:
+            self.refactor()
+            return
+        self._inverse -= np.outer(w / factor, self._inverse[col])
+        self.sign *= np.sign(factor)
+        self.log_abs_det += np.log(abs(factor))
+        self.updates_since_refactor += 1
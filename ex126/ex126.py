@@ -1,16 +1,99 @@
-import pandas as pd
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QLineEdit, \
-    QLabel, QHBoxLayout
+import numpy as np
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QLineEdit, \
+    QLabel, QHBoxLayout, QComboBox, QProgressBar
 import sys
 
-# Load dataset
-dataset_url = "https://tranduythanh.com/datasets/TCB_2018_2020.csv"
-df = pd.read_csv(dataset_url, index_col=0)
+from tcb_index import ColumnIndex, DateIndex
+from tcb_store import Cancelled, load_table
+
+
+class WorkerSignals(QObject):
+    # Every signal carries the generation of the request it answers
+    progress = pyqtSignal(int, object, object)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class Worker(QRunnable):
+    # Runs task(progress, cancelled) on the thread pool. A request is cancelled once a newer
+    # one of the same kind has been submitted; the task checks cancelled() between steps
+    # and the viewer drops anything a stale worker still manages to emit.
+    def __init__(self, generation, task, is_current):
+        super().__init__()
+        self.generation = generation
+        self.task = task
+        self.is_current = is_current
+        self.signals = WorkerSignals()
+
+    def cancelled(self):
+        return not self.is_current(self.generation)
+
+    def progress(self, done, total):
+        self.signals.progress.emit(self.generation, done, total)
+
+    def run(self):
+        if self.cancelled():
+            return
+        try:
+            result = self.task(self.progress, self.cancelled)
+        except Cancelled:
+            return
+        except Exception as error:
+            self.signals.failed.emit(self.generation, str(error))
+            return
+        self.signals.finished.emit(self.generation, result)
+
+
+class DataFrameModel(QAbstractTableModel):
+    # Serves cells straight from the DataFrame's column arrays; the view only asks for the
+    # visible ones. Filters and searches swap in a different array of row positions.
+    def __init__(self, data, parent=None):
+        super().__init__(parent)
+        self.headers = [str(column) for column in data.columns]
+        self.columns = [data[column].to_numpy() for column in data.columns]
+        self.labels = data.index.to_numpy()
+        if self.labels.dtype.kind == "M":
+            # Midnight timestamps show as plain dates, intraday ones keep their time
+            self.format_label = lambda value: np.datetime_as_string(value, unit="auto")
+        else:
+            self.format_label = str
+        self.rows = np.arange(len(data))
+
+    def set_rows(self, rows):
+        # A slice (from a date query) becomes a range, which is indexed without being materialized
+        self.beginResetModel()
+        if isinstance(rows, slice):
+            self.rows = range(*rows.indices(len(self.labels)))
+        else:
+            self.rows = np.asarray(rows, dtype=np.intp)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        return str(self.columns[index.column()][self.rows[index.row()]])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return self.format_label(self.labels[self.rows[section]])
 
 
 class TCBViewer(QWidget):
-    def __init__(self):
+    def __init__(self, source=None):
         super().__init__()
+        self.source = source
+        self.pool = QThreadPool.globalInstance()
+        self.generations = {"load": 0, "query": 0}
         self.setWindowTitle("TCB Data Viewer")
         self.setGeometry(100, 100, 900, 600)
         self.initUI()
@@ -19,74 +102,142 @@ class TCBViewer(QWidget):
         layout = QVBoxLayout()
 
         # Input fields for filtering data
+        self.column_input = QComboBox()
         self.x_input = QLineEdit()
         self.y_input = QLineEdit()
         self.filter_button = QPushButton("Filter Data")
         self.filter_button.clicked.connect(self.filter_data)
 
-        # Input field for date search
+        # Input fields for date search: a single period, or a from/to range
         self.date_input = QLineEdit()
+        self.date_to_input = QLineEdit()
+        self.date_to_input.setPlaceholderText("optional")
         self.search_button = QPushButton("Search Date")
         self.search_button.clicked.connect(self.search_date)
 
-        # Table widget to display data
-        self.tableWidget = QTableWidget()
-        self.load_data()
+        # Table view to display data
+        self.tableView = QTableView()
+
+        # Progress of the running load or query, and the last error
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        self.status_label = QLabel()
 
         # Layouts for inputs
         input_layout = QHBoxLayout()
-        input_layout.addWidget(QLabel("Min Close:"))
+        input_layout.addWidget(self.column_input)
+        input_layout.addWidget(QLabel("Min:"))
         input_layout.addWidget(self.x_input)
-        input_layout.addWidget(QLabel("Max Close:"))
+        input_layout.addWidget(QLabel("Max:"))
         input_layout.addWidget(self.y_input)
         input_layout.addWidget(self.filter_button)
 
         date_layout = QHBoxLayout()
-        date_layout.addWidget(QLabel("Date (YYYY-MM-DD):"))
+        date_layout.addWidget(QLabel("Date (YYYY, YYYY-MM, YYYYQn or YYYY-MM-DD):"))
         date_layout.addWidget(self.date_input)
+        date_layout.addWidget(QLabel("To:"))
+        date_layout.addWidget(self.date_to_input)
         date_layout.addWidget(self.search_button)
 
         layout.addLayout(input_layout)
         layout.addLayout(date_layout)
-        layout.addWidget(self.tableWidget)
+        layout.addWidget(self.tableView)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
         self.setLayout(layout)
+        self.load_data()
+
+    def submit(self, kind, task, on_finished):
+        # Results, progress and errors reach the GUI thread as queued signals
+        self.generations[kind] += 1
+        is_current = lambda generation: generation == self.generations[kind]
+        worker = Worker(self.generations[kind], task, is_current)
+        worker.signals.progress.connect(
+            lambda generation, done, total: is_current(generation) and self.show_progress(done, total))
+        worker.signals.finished.connect(
+            lambda generation, result: is_current(generation) and self.task_done(on_finished, result))
+        worker.signals.failed.connect(
+            lambda generation, message: is_current(generation) and self.task_done(self.status_label.setText, message))
+        self.status_label.clear()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.pool.start(worker)
+
+    def show_progress(self, done, total):
+        # Shown in percent since byte counts overflow the bar's int range
+        if total:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(int(100 * done / total))
+
+    def task_done(self, callback, value):
+        self.progress_bar.hide()
+        callback(value)
 
     def load_data(self):
-        num_rows, num_cols = df.shape
-        self.tableWidget.setRowCount(num_rows)
-        self.tableWidget.setColumnCount(num_cols)
-        self.tableWidget.setHorizontalHeaderLabels(df.columns)
-        for row in range(num_rows):
-            for col in range(num_cols):
-                item = QTableWidgetItem(str(df.iloc[row, col]))
-                self.tableWidget.setItem(row, col, item)
+        # Served from the local column cache; only the first run for a source parses the CSV.
+        # Queries are disabled until the data is in, and any still running are dropped.
+        self.filter_button.setEnabled(False)
+        self.search_button.setEnabled(False)
+        self.generations["query"] += 1
+        source = self.source
+
+        def task(progress, cancelled):
+            df = load_table(source, progress=progress, cancelled=cancelled)
+            return df, DateIndex(df.index.to_numpy())
+
+        self.submit("load", task, self.data_loaded)
+
+    def data_loaded(self, result):
+        self.df, self.dates = result
+        # Column indexes are built the first time a column is filtered and dropped on reload
+        self.column_indexes = {}
+        self.model = DataFrameModel(self.df)
+        self.tableView.setModel(self.model)
+
+        numeric = [str(column) for column in self.df.columns if self.df[column].dtype.kind in "iuf"]
+        self.column_input.clear()
+        self.column_input.addItems(numeric)
+        if "Close" in numeric:
+            self.column_input.setCurrentText("Close")
+        self.filter_button.setEnabled(True)
+        self.search_button.setEnabled(True)
 
     def filter_data(self):
-        x = float(self.x_input.text())
-        y = float(self.y_input.text())
-        filtered_df = df[(df['Close'] > x) & (df['Close'] < y)]
-        self.update_table(filtered_df)
+        # A blank bound leaves that side of the range open
+        try:
+            x = float(self.x_input.text()) if self.x_input.text().strip() else None
+            y = float(self.y_input.text()) if self.y_input.text().strip() else None
+        except ValueError:
+            self.status_label.setText("Min and Max must be numbers.")
+            return
+        column = self.column_input.currentText()
+        df, indexes = self.df, self.column_indexes
+
+        def task(progress, cancelled):
+            if column not in indexes:
+                indexes[column] = ColumnIndex(df[column].to_numpy())
+            if cancelled():
+                raise Cancelled()
+            return indexes[column].between(x, y)
+
+        self.submit("query", task, self.model.set_rows)
 
     def search_date(self):
-        date = self.date_input.text()
-        if date in df.index:
-            result_df = df.loc[[date]]
-            self.update_table(result_df)
-        else:
-            self.update_table(pd.DataFrame())
+        start = self.date_input.text().strip()
+        end = self.date_to_input.text().strip()
+        dates = self.dates
 
-    def update_table(self, new_df):
-        self.tableWidget.setRowCount(new_df.shape[0])
-        self.tableWidget.setColumnCount(new_df.shape[1])
-        self.tableWidget.setHorizontalHeaderLabels(new_df.columns)
-        for row in range(new_df.shape[0]):
-            for col in range(new_df.shape[1]):
-                item = QTableWidgetItem(str(new_df.iloc[row, col]))
-                self.tableWidget.setItem(row, col, item)
+        def task(progress, cancelled):
+            try:
+                return dates.range(start, end) if end else dates.period(start)
+            except ValueError:
+                return slice(0, 0)
 
+        self.submit("query", task, self.model.set_rows)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    viewer = TCBViewer()
+    # An OHLCV CSV path or URL can be given instead of the bundled TCB data
+    viewer = TCBViewer(sys.argv[1] if len(sys.argv) > 1 else None)
     viewer.show()
     sys.exit(app.exec())
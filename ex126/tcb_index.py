@@ -0,0 +1,72 @@
+import re
+
+import numpy as np
+
+_QUARTER = re.compile(r"^\s*(\d{4})\s*-?\s*Q([1-4])\s*$", re.IGNORECASE)
+
+
+def parse_period(text):
+    # "2018", "2018-06", "2018-06-05", "2018-06-05T10:30" or "2018Q2" -> [start, stop).
+    # A datetime64 parsed from text keeps the unit it was written in, so adding one of that
+    # unit gives the end of the period: 2018-06 + 1 is 2018-07, 2018 + 1 is 2019.
+    match = _QUARTER.match(text)
+    if match:
+        year, quarter = int(match.group(1)), int(match.group(2))
+        start = np.datetime64(f"{year:04d}-{3 * quarter - 2:02d}")
+        return start, start + 3
+    start = np.datetime64(text.strip())
+    if np.isnat(start):
+        raise ValueError(f"Not a date: {text!r}")
+    return start, start + 1
+
+
+class DateIndex:
+    # Binary searches over a sorted datetime64 array. Every query returns a slice of row
+    # positions, so the rows of a period are a contiguous block of the table.
+    def __init__(self, dates):
+        self.dates = np.asarray(dates)
+        if self.dates.dtype.kind != "M":
+            self.dates = self.dates.astype("datetime64[ns]")
+
+    def between(self, start=None, stop=None):
+        # start is inclusive and stop exclusive; None leaves that side open
+        first = 0 if start is None else int(np.searchsorted(self.dates, start, side="left"))
+        last = len(self.dates) if stop is None else int(np.searchsorted(self.dates, stop, side="left"))
+        return slice(first, max(first, last))
+
+    def period(self, text):
+        return self.between(*parse_period(text))
+
+    def range(self, start_text=None, end_text=None):
+        # Both ends are whole periods: range("2018-06", "2018-08") runs from June 1st to August 31st
+        start = parse_period(start_text)[0] if start_text else None
+        stop = parse_period(end_text)[1] if end_text else None
+        return self.between(start, stop)
+
+    def month(self, year, month):
+        return self.period(f"{year:04d}-{month:02d}")
+
+    def quarter(self, year, quarter):
+        return self.period(f"{year:04d}Q{quarter}")
+
+    def year(self, year):
+        return self.period(f"{year:04d}")
+
+
+class ColumnIndex:
+    # A numeric column sorted once (argsort), so a value range is two binary searches plus a
+    # gather of the matching row positions instead of a scan of the whole column
+    def __init__(self, values):
+        values = np.asarray(values)
+        self.order = np.argsort(values, kind="stable")
+        self.sorted = values[self.order]
+        # NaNs sort to the end; they never fall inside a range, open-ended or not
+        self.valid = len(self.sorted) - int(np.isnan(self.sorted).sum()) if self.sorted.dtype.kind == "f" \
+            else len(self.sorted)
+
+    def between(self, low=None, high=None):
+        # Rows with low < value < high, in table order. None leaves that side open.
+        valid = self.sorted[:self.valid]
+        first = 0 if low is None else int(np.searchsorted(valid, low, side="right"))
+        last = self.valid if high is None else int(np.searchsorted(valid, high, side="left"))
+        return np.sort(self.order[first:max(first, last)])
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATASET_URL = "https://tranduythanh.com/datasets/TCB_2018_2020.csv"
+LOCAL_DATASET = os.path.join(HERE, "TCB_2018_2020.csv")
+CACHE_DIR = os.path.join(HERE, ".tcb_cache")
+
+# Bump when the on-disk layout changes so old caches are rebuilt
+CACHE_VERSION = 3
+
+# Rows parsed between progress reports and cancellation checks. The parser holds the GIL
+# while it works on a chunk, so this also bounds how long a GUI thread can be kept waiting.
+CHUNK_ROWS = 20_000
+
+
+class Cancelled(Exception):
+    pass
+
+
+def default_source():
+    # The copy shipped next to this file works offline; the URL is only a fallback
+    return LOCAL_DATASET if os.path.exists(LOCAL_DATASET) else DATASET_URL
+
+
+def _is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def source_stamp(source):
+    # What the cache is validated against: mtime and size for a file, ETag or
+    # Last-Modified for a URL. None means the source could not be reached.
+    if not _is_url(source):
+        info = os.stat(source)
+        return {"mtime_ns": info.st_mtime_ns, "size": info.st_size}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(source, method="HEAD"), timeout=5) as response:
+            headers = response.headers
+    except (urllib.error.URLError, OSError):
+        return None
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+            "size": headers.get("Content-Length")}
+
+
+def cache_path(source, cache_dir=CACHE_DIR):
+    key = os.path.abspath(source) if not _is_url(source) else source
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def _save_column(path, name, values):
+    # Strings are stored as fixed-width unicode so every column can be memory-mapped
+    if values.dtype == object:
+        values = values.astype(str)
+    np.save(os.path.join(path, name), values)
+
+
+def _parse_dates(frame):
+    # A string index that parses as dates becomes datetime64; any other index is kept as it is
+    if not pd.api.types.is_string_dtype(frame.index.dtype):
+        return frame
+    try:
+        dates = pd.to_datetime(frame.index)
+    except (ValueError, TypeError):
+        return frame
+    return frame.set_axis(dates.rename(frame.index.name))
+
+
+def _date_ordered(frame):
+    # Rows are stored in date order, so date queries can binary-search the index
+    if frame.index.dtype.kind == "M" and not frame.index.is_monotonic_increasing:
+        frame = frame.sort_index(kind="stable")
+    return frame
+
+
+class _CountingReader:
+    # Counts the bytes read from a stream; an HTTP response cannot seek, so tell() is no option
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.count += len(data)
+        return data
+
+
+def read_csv(source, progress=None, cancelled=None):
+    # Parses in chunks of CHUNK_ROWS so a long parse can report progress(done, total) and be
+    # abandoned part way when cancelled() turns true. done and total are bytes; a URL
+    # without Content-Length reports a total of 0.
+    if _is_url(source):
+        file = urllib.request.urlopen(source)
+        total = int(file.headers.get("Content-Length") or 0)
+    else:
+        file = open(source, "rb")
+        total = os.fstat(file.fileno()).st_size
+    with file:
+        reader = _CountingReader(file)
+        chunks = []
+        for chunk in pd.read_csv(reader, index_col=0, chunksize=CHUNK_ROWS):
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+            chunks.append(_parse_dates(chunk))
+            if progress is not None:
+                progress(reader.count, total)
+    frame = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+    if frame.index.dtype == object:
+        # Only some chunks parsed as dates, so the index is kept as text
+        frame = frame.set_axis(frame.index.astype(str))
+    return frame
+
+
+def build_cache(source, path, stamp, progress=None, cancelled=None):
+    # Columns are written to a new data directory and meta.json, which names it, is swapped in
+    # last. Files of an earlier build are never rewritten in place, since another viewer may
+    # still have them memory-mapped.
+    frame = _date_ordered(read_csv(source, progress, cancelled))
+    os.makedirs(path, exist_ok=True)
+    previous = _read_meta(path)
+    data = tempfile.mkdtemp(prefix="data-", dir=path)
+    try:
+        _save_column(data, "index.npy", frame.index.to_numpy())
+        columns = []
+        for i, column in enumerate(frame.columns):
+            _save_column(data, f"column_{i}.npy", frame[column].to_numpy())
+            columns.append([str(column), f"column_{i}.npy"])
+        meta = {"version": CACHE_VERSION, "source": source, "stamp": stamp, "data": os.path.basename(data),
+                "index_name": frame.index.name, "columns": columns}
+        with open(os.path.join(data, "meta.json"), "w") as file:
+            json.dump(meta, file, indent=2)
+        os.replace(os.path.join(data, "meta.json"), os.path.join(path, "meta.json"))
+    except BaseException:
+        shutil.rmtree(data, ignore_errors=True)
+        raise
+    if previous is not None:
+        # Existing mappings of the old files stay valid after they are unlinked (POSIX); where
+        # open files cannot be removed the directory is left for a later rebuild
+        shutil.rmtree(os.path.join(path, previous["data"]), ignore_errors=True)
+    return meta
+
+
+def load_table(source=None, cache_dir=CACHE_DIR, refresh=False, progress=None, cancelled=None):
+    # The first load of a source parses the CSV into one .npy file per column. Later loads
+    # memory-map those files and wrap them without copying, so pages are only read from
+    # disk when a cell is actually looked at.
+    source = source or default_source()
+    path = cache_path(source, cache_dir)
+    meta = _read_meta(path)
+    stamp = source_stamp(source)
+    # An unreachable URL keeps whatever was cached last time
+    if refresh or meta is None or (stamp is not None and meta["stamp"] != stamp):
+        meta = build_cache(source, path, stamp, progress, cancelled)
+
+    data = os.path.join(path, meta["data"])
+    index = np.load(os.path.join(data, "index.npy"), mmap_mode="r")
+    columns = {name: np.load(os.path.join(data, file), mmap_mode="r") for name, file in meta["columns"]}
+    return pd.DataFrame(columns, index=pd.Index(index, name=meta["index_name"], copy=False), copy=False)
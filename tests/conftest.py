@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The repository is not installed; make ex120 and the ex126 modules importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "ex126")]
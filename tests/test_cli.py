@@ -0,0 +1,33 @@
+import numpy as np
+
+from ex120 import STATUS_OK, STATUS_SINGULAR
+from ex120.cli import STATUS_UNREADABLE, apply_operations, main
+
+
+def test_chain_stops_after_a_failed_transform():
+    results = apply_operations(np.array([[1.0, 2.0], [2.0, 4.0]]),
+                               ["inverse", "determinant", "logdet", "rank", "svd"])
+    assert {key: int(value) for key, value in results.items() if key.endswith("/status")} == {
+        "0_inverse/status": STATUS_SINGULAR, "1_determinant/status": STATUS_SINGULAR,
+        "2_logdet/status": STATUS_SINGULAR, "3_rank/status": STATUS_SINGULAR, "4_svd/status": STATUS_SINGULAR}
+    assert "1_determinant" not in results
+
+
+def test_chain_runs_through_after_a_successful_transform():
+    results = apply_operations(np.array([[2.0, 1.0], [1.0, 3.0]]), ["inverse", "determinant"])
+    assert int(results["1_determinant/status"]) == STATUS_OK
+    assert np.isclose(results["1_determinant"], 0.2)
+
+
+def test_unreadable_inputs_do_not_stop_the_batch(tmp_path):
+    good = tmp_path / "good.npy"
+    np.save(good, np.array([[2.0, 1.0], [1.0, 3.0]]))
+    bad = tmp_path / "bad.csv"
+    bad.write_text("1,2\n3,x\n")
+    output = tmp_path / "out.npz"
+    assert main([str(good), str(bad), str(tmp_path / "missing.npy"), "--ops", "determinant",
+                 "-o", str(output), "-j", "1"]) == 1
+    with np.load(output) as results:
+        assert np.isclose(results[f"{good}/0_determinant"], 5.0)
+        assert int(results[f"{bad}/status"]) == STATUS_UNREADABLE
+        assert f"{tmp_path / 'missing.npy'}/error" in results.files
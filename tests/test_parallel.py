@@ -0,0 +1,27 @@
+import os
+import time
+
+import numpy as np
+
+from ex120.parallel import BLAS_THREAD_VARIABLES, MatrixExecutor, blas_limited_pool
+
+
+def _worker_environment(_):
+    time.sleep(0.1)
+    return os.getpid(), tuple(os.environ.get(name) for name in BLAS_THREAD_VARIABLES)
+
+
+def test_every_worker_sees_the_blas_thread_limit():
+    before = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+    with blas_limited_pool(4, blas_threads=1) as pool:
+        seen = set(pool.map(_worker_environment, range(16)))
+    assert len({pid for pid, _ in seen}) == 4
+    assert {environment for _, environment in seen} == {("1",) * len(BLAS_THREAD_VARIABLES)}
+    assert {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES} == before
+
+
+def test_matrix_executor_results():
+    with MatrixExecutor(workers=2) as executor:
+        results = executor.map("determinant", [np.eye(3) * 2, np.array([[1j, 0], [0, 1]])])
+    assert [result.status for result in results] == [0, 0]
+    assert results[0].value == 8.0 and results[1].value == 1j
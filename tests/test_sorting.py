@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from ex120 import RowStatistics, sort_matrix_by_row_avg, sort_rows_by
+
+
+def test_cached_statistics_follow_inplace_sorts():
+    matrix = np.random.default_rng(1).integers(-100, 100, (6, 5))
+    stats = RowStatistics(matrix)
+    for key in ("sum", "max", "sum"):
+        sort_rows_by(matrix, keys=key, stats=stats, inplace=True)
+    assert np.all(np.diff(matrix.sum(axis=1)) >= 0)
+
+    sort_matrix_by_row_avg(matrix, inplace=True, stats=stats)
+    for key, reduce in (("sum", np.sum), ("max", np.max), ("mean", np.mean)):
+        np.testing.assert_array_equal(stats[key], reduce(matrix, axis=1))
+
+
+def test_descending_flags_must_match_keys():
+    matrix = np.array([[0, 1], [5, 2]])
+    assert sort_rows_by(matrix, keys=("max", 1), descending=[True, True], return_indices=True).tolist() == [1, 0]
+    with pytest.raises(ValueError):
+        sort_rows_by(matrix, keys=("max", 1), descending=[True])
@@ -0,0 +1,48 @@
+import functools
+import os
+import shutil
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("pandas")
+
+import tcb_store
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def served_csv(tmp_path):
+    shutil.copy(tcb_store.LOCAL_DATASET, tmp_path / "TCB.csv")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/TCB.csv"
+    server.shutdown()
+    server.server_close()
+
+
+def test_url_loads_with_progress(served_csv, tmp_path):
+    # An HTTP response cannot seek, so progress must not depend on tell()
+    reports = []
+    table = tcb_store.load_table(served_csv, cache_dir=str(tmp_path / "cache"),
+                                 progress=lambda done, total: reports.append((done, total)))
+    size = os.path.getsize(tcb_store.LOCAL_DATASET)
+    assert len(table) == 651
+    assert reports and reports[-1] == (size, size)
+
+
+def test_rebuild_leaves_earlier_tables_readable(tmp_path):
+    source = tmp_path / "TCB.csv"
+    shutil.copy(tcb_store.LOCAL_DATASET, source)
+    cache = str(tmp_path / "cache")
+    before = tcb_store.load_table(str(source), cache_dir=cache)
+    total = before["Close"].sum()
+    after = tcb_store.load_table(str(source), cache_dir=cache, refresh=True)
+    assert before["Close"].sum() == total
+    assert len(after) == len(before)